@@ -1,29 +1,16 @@
-import json
-import pandas as pd
 # import matplotlib.pyplot as plt
 # import seaborn as sns
 import numpy as np
+from data_io import load_json, cases_frame
 
 def analyze_and_plot_errors(results_file='results/results_20250607_150413.json', error_threshold=100):
     """
     Analyzes and prints cases with high errors from a results file.
     """
-    with open(results_file, 'r') as f:
-        data = json.load(f)
+    data = load_json(results_file)
 
     # The last item is a summary, so we exclude it.
-    df = pd.DataFrame(data[:-1])
-
-    # The input values are nested in a dictionary. Let's flatten it.
-    df_input = pd.json_normalize(df['input'])
-    df = pd.concat([df.drop('input', axis=1), df_input], axis=1)
-
-    # Convert columns to numeric types, coercing errors
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output', 'actual_output', 'error']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # Drop rows where conversion failed (e.g., the summary row)
-    df.dropna(subset=['error'], inplace=True)
+    df = cases_frame(data[:-1])
     
     # Filter for bad results
     bad_results = df[df['error'].abs() > error_threshold].copy()
@@ -1,10 +1,29 @@
 import json
 import pandas as pd
-from sklearn.metrics import r2_score
 from joblib import Parallel, delayed
 import itertools
 import numpy as np
 
+def find_best_params(params, miles, receipts, expected, ss_tot):
+    """
+    Returns the R2 score of one parameter tuple against the given rows, along with the tuple.
+    """
+    p_diem, m_rate1, m_thresh, m_rate2, r_rate, r_cap, lr_thresh, lr_penalty = params
+    if m_rate2 >= m_rate1: return -1, params
+
+    mileage_reimbursement = np.where(
+        miles > m_thresh,
+        (m_thresh * m_rate1) + ((miles - m_thresh) * m_rate2),
+        miles * m_rate1
+    )
+    receipt_reimbursement = np.minimum(receipts * r_rate, r_cap)
+
+    test_output = p_diem + mileage_reimbursement + receipt_reimbursement
+    test_output -= np.where((0 < receipts) & (receipts < lr_thresh), lr_penalty, 0)
+
+    r2 = 1 - ((expected - test_output) ** 2).sum() / ss_tot
+    return r2, params
+
 def analyze_data_with_new_formula():
     """
     Analyzes travel expense data for 1-7 day trips with a more complex formula,
@@ -53,33 +72,14 @@ def analyze_data_with_new_formula():
         
         print(f"Optimizing over {len(param_grid)} combinations...")
 
-        def find_best_params(params):
-            p_diem, m_rate1, m_thresh, m_rate2, r_rate, r_cap, lr_thresh, lr_penalty = params
-            if m_rate2 >= m_rate1: return -1, params
-
-            def formula(row):
-                miles = row['miles_traveled']
-                receipts = row['total_receipts_amount']
-                
-                if miles > m_thresh:
-                    mileage_reimbursement = (m_thresh * m_rate1) + ((miles - m_thresh) * m_rate2)
-                else:
-                    mileage_reimbursement = miles * m_rate1
-                
-                receipt_reimbursement = min(receipts * r_rate, r_cap)
-
-                reimbursement = p_diem + mileage_reimbursement + receipt_reimbursement
-                
-                if 0 < receipts < lr_thresh:
-                    reimbursement -= lr_penalty
-                    
-                return reimbursement
-
-            test_output = df_day_clean.apply(formula, axis=1)
-            r2 = r2_score(df_day_clean['expected_output'], test_output)
-            return r2, params
+        miles_arr = df_day_clean['miles_traveled'].to_numpy()
+        receipts_arr = df_day_clean['total_receipts_amount'].to_numpy()
+        expected_arr = df_day_clean['expected_output'].to_numpy()
+        ss_tot = ((expected_arr - expected_arr.mean()) ** 2).sum()
 
-        results = Parallel(n_jobs=-1, verbose=1)(delayed(find_best_params)(p) for p in param_grid)
+        results = Parallel(n_jobs=-1, verbose=1)(
+            delayed(find_best_params)(p, miles_arr, receipts_arr, expected_arr, ss_tot) for p in param_grid
+        )
         
         best_r2, best_params_tuple = max(results, key=lambda item: item[0])
         
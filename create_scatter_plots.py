@@ -1,52 +1,60 @@
-import matplotlib
-matplotlib.use('Agg')
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
+import numpy as np
 import os
+from data_io import load_json, cases_frame
 
-def create_scatter_plots(json_path, output_image_path, top_n=20):
+def compute_worst_cases(json_path, top_n=20):
     """
-    Analyzes trip results, focusing on 1-7 day trips, and generates
-    a set of scatter plots to visualize error patterns.
+    Loads trip results, filters them to 1-7 day trips, and prints the
+    top N worst cases by error.
 
     Args:
         json_path (str): Path to the input JSON file.
-        output_image_path (str): Path to save the output PNG image.
-        top_n (int): Number of worst cases to highlight.
+        top_n (int): Number of worst cases to report.
+
+    Returns:
+        tuple: (filtered_df, worst_cases) DataFrames, or None if the file has no cases.
     """
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+    data = load_json(json_path)
 
     cases = [item for item in data if 'case_number' in item]
     if not cases:
         print("No cases found in the JSON file.")
-        return
-
-    df = pd.DataFrame(cases)
-    df_input = pd.json_normalize(df['input'])
-    df = pd.concat([df.drop('input', axis=1), df_input], axis=1)
+        return None
 
-    numeric_cols = ['trip_duration_days', 'miles_traveled', 'total_receipts_amount',
-                    'expected_output', 'actual_output', 'error']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    df.dropna(subset=numeric_cols, inplace=True)
-    df['trip_duration_days'] = df['trip_duration_days'].astype(int)
+    df = cases_frame(cases)
 
     # Filter for trip duration between 1 and 7 days
     filtered_df = df[df['trip_duration_days'].between(1, 7)].copy()
 
-    # Identify the top N worst cases
-    worst_cases = filtered_df.sort_values('error', ascending=False).head(top_n)
+    # Identify the top N worst cases; argpartition finds them without sorting every row
+    errors = filtered_df['error'].to_numpy()
+    worst_idx = np.argpartition(errors, -top_n)[-top_n:] if len(errors) > top_n else np.arange(len(errors))
+    worst_cases = filtered_df.iloc[worst_idx].sort_values('error', ascending=False)
     
     # Print the worst cases table
     print(f"Top {top_n} worst cases by error (1-7 day trips) from {os.path.basename(json_path)}:")
     print(worst_cases[['case_number', 'trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output', 'actual_output', 'error']].to_string())
 
-    # --- Plotting ---
+    return filtered_df, worst_cases
+
+def plot_worst_cases(filtered_df, worst_cases, json_path, output_image_path, top_n=20):
+    """
+    Generates a set of scatter plots of the 1-7 day trip errors, highlighting the worst cases.
+
+    Args:
+        filtered_df (pd.DataFrame): 1-7 day trip results from compute_worst_cases.
+        worst_cases (pd.DataFrame): Worst cases from compute_worst_cases.
+        json_path (str): Path to the input JSON file, used in the plot title.
+        output_image_path (str): Path to save the output PNG image.
+        top_n (int): Number of worst cases highlighted.
+    """
+    # Imported here so table-only runs (--no-plot) skip the matplotlib/seaborn import cost
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.style.use('dark_background')
     fig, axes = plt.subplots(2, 2, figsize=(20, 16))
     fig.suptitle(f'Error Analysis for 1-7 Day Trips\n(Source: {os.path.basename(json_path)})', fontsize=22, y=1.03)
@@ -88,10 +96,16 @@ def create_scatter_plots(json_path, output_image_path, top_n=20):
     print(f"\nScatter plots saved to {output_image_path}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report and plot the worst 1-7 day trip errors.')
+    parser.add_argument('--no-plot', action='store_true', help='Only print the worst-cases table.')
+    args = parser.parse_args()
+
     json_file = 'results/results_20250607_172454.json'
     output_dir = 'results'
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     output_file = os.path.join(output_dir, 'error_scatter_analysis_172454.png')
     
-    create_scatter_plots(json_file, output_file) 
\ No newline at end of file
+    result = compute_worst_cases(json_file)
+    if result is not None and not args.no_plot:
+        plot_worst_cases(*result, json_file, output_file)
@@ -1,24 +1,36 @@
-import json
 import pandas as pd
-from sklearn.metrics import r2_score
-from joblib import Parallel, delayed
-import itertools
+import numpy as np
+from data_io import load_cases, day_columns, score_in_chunks, CASE_COLUMNS
+
+def score_chunk(param_chunk, miles, receipts, expected, ss_tot):
+    """
+    Returns the R2 score of every parameter tuple in param_chunk against the given rows.
+    The chunk is evaluated as one (params, rows) array.
+    """
+    per_diem, m_rate, r_rate, r_cap = (col[:, None] for col in param_chunk.T)
+
+    mileage = miles * m_rate
+    receipt_reimbursement = np.minimum(receipts * r_rate, r_cap)
+    test_output = per_diem + mileage + receipt_reimbursement
+
+    residuals = (expected - test_output).astype(np.float64)
+    ss_res = (residuals ** 2).sum(axis=1)
+    return 1 - ss_res / ss_tot
 
 def analyze_data_with_plots_part1():
     """
     Analyzes the travel expense data for trips lasting 1 to 7 days.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df = pd.DataFrame([d['input'] for d in data])
-    df['expected_output'] = [d['expected_output'] for d in data]
+    df = pd.DataFrame(load_cases(), columns=CASE_COLUMNS)
 
     # --- Outlier/Bug Identification ---
-    outlier_condition = (df['total_receipts_amount'] > 500) & (df['expected_output'] < 500)
-    outliers = df[outlier_condition]
-    outlier_indices = outliers.index
-    print(f"Identified {len(outliers)} outlier rows to exclude from training.")
+    receipts = df['total_receipts_amount'].to_numpy()
+    expected = df['expected_output'].to_numpy()
+    is_outlier = (receipts > 500) & (expected < 500)
+    outlier_indices = np.flatnonzero(is_outlier)
+    print(f"Identified {len(outlier_indices)} outlier rows to exclude from training.")
+
+    day_idx, all_miles, all_receipts, all_expected = day_columns(df, range(1, 8))
 
     # --- Analysis Loop for Days 1-7 ---
     for day in range(1, 8):
@@ -26,11 +38,10 @@ def analyze_data_with_plots_part1():
         print(f"Refining formula for {day}-day trips (excluding identified outliers).")
         print("="*80)
 
-        df_day = df[df['trip_duration_days'] == day]
-        df_day_clean = df_day.drop(outlier_indices, errors='ignore')
-        print(f"Analyzing {len(df_day_clean)} of {len(df_day)} {day}-day trips.")
+        idx = np.setdiff1d(day_idx[day], outlier_indices, assume_unique=True)
+        print(f"Analyzing {len(idx)} of {len(day_idx[day])} {day}-day trips.")
 
-        if len(df_day_clean) < 5:
+        if len(idx) < 5:
             print("Not enough data to find a reliable formula.")
             continue
 
@@ -40,25 +51,22 @@ def analyze_data_with_plots_part1():
         receipt_rates = [x / 100 for x in range(30, 71, 5)]
         receipt_caps = range(800, 1501, 50)
         
-        param_grid = list(itertools.product(per_diems, mileage_rates, receipt_rates, receipt_caps))
-        print(f"Optimizing over {len(param_grid)} combinations for {day}-day trips...")
+        # The candidate grid is one contiguous float32 (combinations, parameters) array,
+        # in the same order itertools.product would have produced the tuples.
+        axes = [per_diems, mileage_rates, receipt_rates, receipt_caps]
+        param_arr = np.stack(
+            np.meshgrid(*(np.array(axis, dtype=np.float32) for axis in axes), indexing='ij'), axis=-1
+        ).reshape(-1, len(axes))
+        print(f"Optimizing over {len(param_arr)} combinations for {day}-day trips...")
 
-        def find_best_params(params):
-            from sklearn.metrics import r2_score
-            per_diem, m_rate, r_rate, r_cap = params
-            
-            def formula(miles, receipts):
-                mileage = miles * m_rate
-                receipt_reimbursement = min(receipts * r_rate, r_cap)
-                return per_diem + mileage + receipt_reimbursement
+        miles_arr, receipts_arr, expected_arr = all_miles[idx], all_receipts[idx], all_expected[idx]
+        ss_tot = ((expected_arr.astype(np.float64) - expected_arr.mean(dtype=np.float64)) ** 2).sum()
 
-            test_output = df_day_clean.apply(lambda row: formula(row['miles_traveled'], row['total_receipts_amount']), axis=1)
-            r2 = r2_score(df_day_clean['expected_output'], test_output)
-            return r2, params
+        r2_scores = score_in_chunks(score_chunk, param_arr, miles_arr, receipts_arr, expected_arr, ss_tot)
 
-        results = Parallel(n_jobs=-1, verbose=1)(delayed(find_best_params)(p) for p in param_grid)
-        
-        best_r2, best_params_tuple = max(results, key=lambda item: item[0])
+        best_index = r2_scores.argmax()
+        best_r2 = float(r2_scores[best_index])
+        best_params_tuple = tuple(axis[i] for axis, i in zip(axes, np.unravel_index(best_index, [len(axis) for axis in axes])))
         best_params = {
             'per_diem': best_params_tuple[0],
             'mileage_rate': best_params_tuple[1],
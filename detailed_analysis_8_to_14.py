@@ -2,10 +2,30 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
 from sklearn.metrics import r2_score
 from joblib import Parallel, delayed
 import itertools
 
+def find_best_params(params, miles, receipts, duration, expected, ss_tot):
+    """
+    Returns the R2 score of one parameter tuple against the given rows, along with the tuple.
+    """
+    per_diem, m_rate, r_rate, t1, t2, bonus = params
+    
+    # Use a fixed cap for simplicity, can be tuned later
+    r_cap = 1000
+
+    miles_per_day = miles / duration
+    efficiency_bonus = np.where((t1 <= miles_per_day) & (miles_per_day < t2), bonus, 0)
+
+    mileage = miles * m_rate
+    receipt_reimbursement = np.minimum(receipts * r_rate, r_cap)
+    test_output = per_diem + mileage + receipt_reimbursement + efficiency_bonus
+
+    r2 = 1 - ((expected - test_output) ** 2).sum() / ss_tot
+    return r2, params
+
 def analyze_data_with_plots_part2():
     """
     Analyzes the travel expense data for trips lasting 8 to 14 days.
@@ -49,28 +69,15 @@ def analyze_data_with_plots_part2():
         param_grid = list(itertools.product(per_diems, mileage_rates, receipt_rates, threshold1s, threshold2s, flat_bonuses))
         print(f"Optimizing over {len(param_grid)} combinations for {day}-day trips...")
 
-        def find_best_params(params):
-            from sklearn.metrics import r2_score
-            per_diem, m_rate, r_rate, t1, t2, bonus = params
-            
-            # Use a fixed cap for simplicity, can be tuned later
-            r_cap = 1000
-
-            def formula(miles, receipts, duration):
-                miles_per_day = miles / duration
-                efficiency_bonus = 0
-                if t1 <= miles_per_day < t2:
-                    efficiency_bonus = bonus
-                
-                mileage = miles * m_rate
-                receipt_reimbursement = min(receipts * r_rate, r_cap)
-                return per_diem + mileage + receipt_reimbursement + efficiency_bonus
-
-            test_output = df_day_clean.apply(lambda row: formula(row['miles_traveled'], row['total_receipts_amount'], row['trip_duration_days']), axis=1)
-            r2 = r2_score(df_day_clean['expected_output'], test_output)
-            return r2, params
-
-        results = Parallel(n_jobs=-1, verbose=0)(delayed(find_best_params)(p) for p in param_grid)
+        miles_arr = df_day_clean['miles_traveled'].to_numpy()
+        receipts_arr = df_day_clean['total_receipts_amount'].to_numpy()
+        duration_arr = df_day_clean['trip_duration_days'].to_numpy()
+        expected_arr = df_day_clean['expected_output'].to_numpy()
+        ss_tot = ((expected_arr - expected_arr.mean()) ** 2).sum()
+
+        results = Parallel(n_jobs=-1, verbose=0)(
+            delayed(find_best_params)(p, miles_arr, receipts_arr, duration_arr, expected_arr, ss_tot) for p in param_grid
+        )
         
         best_r2, best_params_tuple = max(results, key=lambda item: item[0])
         best_params = {
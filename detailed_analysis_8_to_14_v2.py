@@ -1,26 +1,39 @@
-import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
 from sklearn.metrics import r2_score
-from joblib import Parallel, delayed
-import itertools
+from data_io import load_cases, day_columns, score_in_chunks, CASE_COLUMNS
+
+def score_chunk(param_chunk, miles, receipts, miles_per_day, expected, ss_tot, r_cap):
+    """
+    Returns the R2 score of every parameter tuple in param_chunk against the given rows.
+    The chunk is evaluated as one (params, rows) array.
+    """
+    per_diem, m_rate, r_rate, t1, t2, bonus = (col[:, None] for col in param_chunk.T)
+
+    efficiency_bonus = np.where((t1 <= miles_per_day) & (miles_per_day < t2), bonus, 0)
+    mileage = miles * m_rate
+    receipt_reimbursement = np.minimum(receipts * r_rate, r_cap)
+    test_output = per_diem + mileage + receipt_reimbursement + efficiency_bonus
+
+    residuals = (expected - test_output).astype(np.float64)
+    ss_res = (residuals ** 2).sum(axis=1)
+    return 1 - ss_res / ss_tot
 
 def analyze_data_with_plots_part2():
     """
     Analyzes the travel expense data for trips lasting 8 to 14 days.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df = pd.DataFrame([d['input'] for d in data])
-    df['expected_output'] = [d['expected_output'] for d in data]
+    df = pd.DataFrame(load_cases(), columns=CASE_COLUMNS)
 
     # --- Outlier/Bug Identification ---
-    outlier_condition = (df['total_receipts_amount'] > 500) & (df['expected_output'] < 500)
-    outliers = df[outlier_condition]
-    outlier_indices = outliers.index
-    print(f"Identified {len(outliers)} outlier rows to exclude from training.")
+    receipts = df['total_receipts_amount'].to_numpy()
+    expected = df['expected_output'].to_numpy()
+    is_outlier = (receipts > 500) & (expected < 500)
+    outlier_indices = np.flatnonzero(is_outlier)
+    print(f"Identified {len(outlier_indices)} outlier rows to exclude from training.")
+    day_idx, all_miles, all_receipts, all_expected = day_columns(df, range(8, 15))
 
     # --- Analysis Loop for Days 8-14 ---
     for day in range(8, 15):
@@ -28,11 +41,10 @@ def analyze_data_with_plots_part2():
         print(f"Refining formula for {day}-day trips (excluding identified outliers).")
         print("="*80)
 
-        df_day = df[df['trip_duration_days'] == day]
-        df_day_clean = df_day.drop(outlier_indices, errors='ignore')
-        print(f"Analyzing {len(df_day_clean)} of {len(df_day)} {day}-day trips.")
+        idx = np.setdiff1d(day_idx[day], outlier_indices, assume_unique=True)
+        print(f"Analyzing {len(idx)} of {len(day_idx[day])} {day}-day trips.")
 
-        if len(df_day_clean) < 5:
+        if len(idx) < 5:
             print("Not enough data to find a reliable formula.")
             continue
 
@@ -46,33 +58,28 @@ def analyze_data_with_plots_part2():
         threshold2s = [200, 250, 300]
         flat_bonuses = [100, 200, 300, 400, 500]
 
-        param_grid = list(itertools.product(per_diems, mileage_rates, receipt_rates, threshold1s, threshold2s, flat_bonuses))
-        print(f"Optimizing over {len(param_grid)} combinations for {day}-day trips...")
-
-        def find_best_params(params):
-            from sklearn.metrics import r2_score
-            per_diem, m_rate, r_rate, t1, t2, bonus = params
-            
-            # Use a fixed cap for simplicity, can be tuned later
-            r_cap = 1000
-
-            def formula(miles, receipts, duration):
-                miles_per_day = miles / duration
-                efficiency_bonus = 0
-                if t1 <= miles_per_day < t2:
-                    efficiency_bonus = bonus
-                
-                mileage = miles * m_rate
-                receipt_reimbursement = min(receipts * r_rate, r_cap)
-                return per_diem + mileage + receipt_reimbursement + efficiency_bonus
-
-            test_output = df_day_clean.apply(lambda row: formula(row['miles_traveled'], row['total_receipts_amount'], row['trip_duration_days']), axis=1)
-            r2 = r2_score(df_day_clean['expected_output'], test_output)
-            return r2, params
-
-        results = Parallel(n_jobs=-1, verbose=0)(delayed(find_best_params)(p) for p in param_grid)
-        
-        best_r2, best_params_tuple = max(results, key=lambda item: item[0])
+        # The candidate grid is one contiguous float32 (combinations, parameters) array,
+        # in the same order itertools.product would have produced the tuples.
+        axes = [per_diems, mileage_rates, receipt_rates, threshold1s, threshold2s, flat_bonuses]
+        param_arr = np.stack(
+            np.meshgrid(*(np.array(axis, dtype=np.float32) for axis in axes), indexing='ij'), axis=-1
+        ).reshape(-1, len(axes))
+        print(f"Optimizing over {len(param_arr)} combinations for {day}-day trips...")
+
+        miles_arr, receipts_arr, expected_arr = all_miles[idx], all_receipts[idx], all_expected[idx]
+        ss_tot = ((expected_arr.astype(np.float64) - expected_arr.mean(dtype=np.float64)) ** 2).sum()
+        miles_per_day = miles_arr / day
+
+        # Use a fixed cap for simplicity, can be tuned later
+        r_cap = 1000
+
+        r2_scores = score_in_chunks(
+            score_chunk, param_arr, miles_arr, receipts_arr, miles_per_day, expected_arr, ss_tot, r_cap
+        )
+
+        best_index = r2_scores.argmax()
+        best_r2 = float(r2_scores[best_index])
+        best_params_tuple = tuple(axis[i] for axis, i in zip(axes, np.unravel_index(best_index, [len(axis) for axis in axes])))
         best_params = {
             'per_diem': best_params_tuple[0],
             'mileage_rate': best_params_tuple[1],
@@ -90,14 +97,17 @@ def analyze_data_with_plots_part2():
     print("Training a Gradient Boosting Model for trips of 8-14 days.")
     print("="*80)
 
-    df_long_trips = df[df['trip_duration_days'] >= 8]
-    df_long_trips_clean = df_long_trips.drop(outlier_indices, errors='ignore')
+    # The long trips are the rows of every day_idx entry, minus the outliers
+    df_long_trips_clean = df.iloc[np.setdiff1d(np.concatenate(list(day_idx.values())), outlier_indices)]
     
     X = df_long_trips_clean[['trip_duration_days', 'miles_traveled', 'total_receipts_amount']]
     y = df_long_trips_clean['expected_output']
     
-    from sklearn.ensemble import GradientBoostingRegressor
-    gbr = GradientBoostingRegressor(n_estimators=200, random_state=42, max_depth=5, learning_rate=0.05)
+    # The histogram-based booster bins each feature into at most 255 buckets before split finding,
+    # which is much faster than the exact-split GradientBoostingRegressor on these few features.
+    # min_samples_leaf=1 keeps GradientBoostingRegressor's default, since the outlier set is small.
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    gbr = HistGradientBoostingRegressor(max_iter=200, random_state=42, max_depth=5, learning_rate=0.05, min_samples_leaf=1)
     gbr.fit(X, y)
     
     from sklearn.metrics import r2_score
@@ -111,13 +121,13 @@ def analyze_data_with_plots_part2():
     print("Training a Gradient Boosting Model for LONG-TRIP OUTLIERS.")
     print("="*80)
 
-    df_outliers = df.loc[outlier_indices]
+    df_outliers = df.iloc[outlier_indices]
     
     X_outliers = df_outliers[['trip_duration_days', 'miles_traveled', 'total_receipts_amount']]
     y_outliers = df_outliers['expected_output']
 
     if not df_outliers.empty:
-        gbr_outliers = GradientBoostingRegressor(n_estimators=100, random_state=42, max_depth=3, learning_rate=0.05)
+        gbr_outliers = HistGradientBoostingRegressor(max_iter=100, random_state=42, max_depth=3, learning_rate=0.05, min_samples_leaf=1)
         gbr_outliers.fit(X_outliers, y_outliers)
         
         print(f"R2 score for the long-trip OUTLIER model: {r2_score(y_outliers, gbr_outliers.predict(X_outliers)):.6f}")
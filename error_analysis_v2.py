@@ -1,22 +1,13 @@
-import json
-import pandas as pd
 import numpy as np
+from data_io import load_json, cases_frame
 
 def analyze_latest_errors(results_file='results/results_20250607_153804.json'):
     """
     Analyzes the latest error report to identify patterns in the new high-error cases.
     """
-    with open(results_file, 'r') as f:
-        data = json.load(f)
+    data = load_json(results_file)
 
-    df = pd.DataFrame(data[:-1])
-    df_input = pd.json_normalize(df['input'])
-    df = pd.concat([df.drop('input', axis=1), df_input], axis=1)
-
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output', 'actual_output', 'error']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    df.dropna(subset=['error'], inplace=True)
+    df = cases_frame(data[:-1])
     df['abs_error'] = df['error'].abs()
     
     high_error_df = df.sort_values(by='abs_error', ascending=False)
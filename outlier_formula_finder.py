@@ -1,25 +1,16 @@
-import json
 import pandas as pd
-from sklearn.metrics import r2_score, mean_absolute_error
 from joblib import Parallel, delayed
 import itertools
 import numpy as np
+from data_io import load_json, cases_frame
 
 def find_outlier_formula(results_file='results/results_20250607_150413.json'):
     """
     Analyzes high-error, high-receipt cases to find a penalty formula.
     """
-    with open(results_file, 'r') as f:
-        data = json.load(f)
+    data = load_json(results_file)
 
-    df = pd.DataFrame(data[:-1])
-    df_input = pd.json_normalize(df['input'])
-    df = pd.concat([df.drop('input', axis=1), df_input], axis=1)
-
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output', 'actual_output', 'error']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    df.dropna(subset=['error'], inplace=True)
+    df = cases_frame(data[:-1])
     
     # Isolate the "buggy" cases based on our previous analysis
     # High error, and an expected output that is much lower than our formula's output
@@ -46,21 +37,20 @@ def find_outlier_formula(results_file='results/results_20250607_150413.json'):
         7: {'per_diem': 490, 'mileage_rate1': 0.64, 'mileage_threshold': 125, 'mileage_rate2': 0.50}
     }
 
-    def calculate_base_reimbursement(row):
-        day = int(row['trip_duration_days'])
-        if day not in rules: return 0
-        
-        rule = rules[day]
-        miles = row['miles_traveled']
-        
-        if miles > rule['mileage_threshold']:
-            mileage = (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2'])
-        else:
-            mileage = miles * rule['mileage_rate1']
-            
-        return rule['per_diem'] + mileage
+    # Turn the rules into per-day lookup tables so the base is computed for all rows at once.
+    # Days without a rule get all-zero rates, i.e. a base reimbursement of 0.
+    day = outlier_df['trip_duration_days'].astype(int).to_numpy()
+    miles = outlier_df['miles_traveled'].to_numpy()
+    rule_table = pd.DataFrame.from_dict(rules, orient='index').reindex(range(day.max() + 1), fill_value=0)
 
-    outlier_df['base_reimbursement'] = outlier_df.apply(calculate_base_reimbursement, axis=1)
+    per_diem = rule_table['per_diem'].to_numpy()[day]
+    m_rate1 = rule_table['mileage_rate1'].to_numpy()[day]
+    m_thresh = rule_table['mileage_threshold'].to_numpy()[day]
+    m_rate2 = rule_table['mileage_rate2'].to_numpy()[day]
+
+    mileage = np.where(miles > m_thresh, (m_thresh * m_rate1) + ((miles - m_thresh) * m_rate2), miles * m_rate1)
+
+    outlier_df['base_reimbursement'] = per_diem + mileage
     outlier_df['receipt_component_actual'] = outlier_df['expected_output'] - outlier_df['base_reimbursement']
 
     print("\nAnalysis of the 'receipt component' for buggy cases:")
@@ -69,17 +59,14 @@ def find_outlier_formula(results_file='results/results_20250607_150413.json'):
     # Now, let's try to find a formula for 'receipt_component_actual'
     # Hypothesis: It's a simple percentage of the receipts, but a *different* percentage.
     
-    penalty_rates = [x / 100 for x in range(-50, 51, 5)] # Testing negative (penalty) and positive rates
-    
-    best_mae = float('inf')
-    best_rate = 0
+    # Score every candidate rate at once: rows x rates predictions, one MAE per rate.
+    penalty_rates = np.array([x / 100 for x in range(-50, 51, 5)]) # Testing negative (penalty) and positive rates
+    receipts = outlier_df['total_receipts_amount'].to_numpy()
+    receipt_component = outlier_df['receipt_component_actual'].to_numpy()
 
-    for rate in penalty_rates:
-        outlier_df['predicted_receipt_comp'] = outlier_df['total_receipts_amount'] * rate
-        mae = mean_absolute_error(outlier_df['receipt_component_actual'], outlier_df['predicted_receipt_comp'])
-        if mae < best_mae:
-            best_mae = mae
-            best_rate = rate
+    maes = np.abs(receipts[:, None] * penalty_rates[None, :] - receipt_component[:, None]).mean(axis=0)
+    best_mae = maes.min()
+    best_rate = penalty_rates[maes.argmin()]
             
     print(f"\nBest single penalty/reimbursement rate found for buggy receipts: {best_rate:.2f}")
     print(f"Mean Absolute Error with this rate: ${best_mae:.2f}")
@@ -1,17 +1,20 @@
-import json
+import os
+import sys
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Only writes PNGs, so no GUI backend is needed
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# data_io lives in the repository root, one level up from this script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_io import load_cases, CASE_COLUMNS
+
 def plot_long_trip_data():
     """
     Creates focused plots for trips lasting 8 to 14 days to help with analysis.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df = pd.DataFrame([d['input'] for d in data])
-    df['expected_output'] = [d['expected_output'] for d in data]
+    df = pd.DataFrame(load_cases(), columns=CASE_COLUMNS).astype({'trip_duration_days': 'int64'})
 
     # Filter for long trips
     df_long = df[df['trip_duration_days'] >= 8].copy()
@@ -24,33 +27,36 @@ def plot_long_trip_data():
     print(df_long.describe())
 
     # Create plots for long trips
-    plt.figure(figsize=(12, 7))
-    sns.scatterplot(data=df_long, x='miles_traveled', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80)
-    plt.title('Long Trips (8-14 Days): Miles Traveled vs. Expected Output')
-    plt.xlabel('Miles Traveled')
-    plt.ylabel('Expected Output')
-    plt.grid(True)
-    plt.savefig('long_trips_miles_vs_output.png')
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.scatterplot(data=df_long, x='miles_traveled', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80, ax=ax)
+    ax.set_title('Long Trips (8-14 Days): Miles Traveled vs. Expected Output')
+    ax.set_xlabel('Miles Traveled')
+    ax.set_ylabel('Expected Output')
+    ax.grid(True)
+    fig.savefig('long_trips_miles_vs_output.png')
+    plt.close(fig)
     print("\nGenerated long_trips_miles_vs_output.png")
 
-    plt.figure(figsize=(12, 7))
-    sns.scatterplot(data=df_long, x='total_receipts_amount', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80)
-    plt.title('Long Trips (8-14 Days): Total Receipts Amount vs. Expected Output')
-    plt.xlabel('Total Receipts Amount')
-    plt.ylabel('Expected Output')
-    plt.grid(True)
-    plt.savefig('long_trips_receipts_vs_output.png')
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.scatterplot(data=df_long, x='total_receipts_amount', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80, ax=ax)
+    ax.set_title('Long Trips (8-14 Days): Total Receipts Amount vs. Expected Output')
+    ax.set_xlabel('Total Receipts Amount')
+    ax.set_ylabel('Expected Output')
+    ax.grid(True)
+    fig.savefig('long_trips_receipts_vs_output.png')
+    plt.close(fig)
     print("Generated long_trips_receipts_vs_output.png")
 
     # Efficiency Plot
     df_long['miles_per_day'] = df_long['miles_traveled'] / df_long['trip_duration_days']
-    plt.figure(figsize=(12, 7))
-    sns.scatterplot(data=df_long, x='miles_per_day', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80)
-    plt.title('Long Trips (8-14 Days): Efficiency (Miles/Day) vs. Expected Output')
-    plt.xlabel('Miles per Day')
-    plt.ylabel('Expected Output')
-    plt.grid(True)
-    plt.savefig('long_trips_efficiency_vs_output.png')
+    fig, ax = plt.subplots(figsize=(12, 7))
+    sns.scatterplot(data=df_long, x='miles_per_day', y='expected_output', hue='trip_duration_days', style='is_outlier', palette='viridis', alpha=0.8, s=80, ax=ax)
+    ax.set_title('Long Trips (8-14 Days): Efficiency (Miles/Day) vs. Expected Output')
+    ax.set_xlabel('Miles per Day')
+    ax.set_ylabel('Expected Output')
+    ax.grid(True)
+    fig.savefig('long_trips_efficiency_vs_output.png')
+    plt.close(fig)
     print("Generated long_trips_efficiency_vs_output.png")
 
 if __name__ == '__main__':
@@ -0,0 +1,66 @@
+import numpy as np
+from data_io import OUTLIER_THRESHOLDS
+
+RULE_COLUMNS = ['per_diem', 'mileage_rate1', 'mileage_threshold', 'mileage_rate2', 'receipt_rate',
+                'receipt_cap', 'low_receipt_threshold', 'low_receipt_penalty', 'outlier_receipt_rate']
+
+def rules_to_array(rules):
+    """
+    Packs a {day: rule} dict into a (15, len(RULE_COLUMNS)) array indexed by trip day.
+    Rules without an 'outlier_receipt_rate' pay outliers at 0.45. Days without a rule
+    are left as NaN.
+    """
+    rules_arr = np.full((len(OUTLIER_THRESHOLDS), len(RULE_COLUMNS)), np.nan)
+    for day, rule in rules.items():
+        rule = {'outlier_receipt_rate': 0.45, **rule}
+        rules_arr[day] = [rule[col] for col in RULE_COLUMNS]
+    return rules_arr
+
+def reimburse(miles, receipts, is_outlier, per_diem, mr1, mt, mr2, rr, rc, low_thr, low_pen, out_rate):
+    """
+    Rule-based (1-7 day) reimbursement, rounded to cents. The rule parameters broadcast
+    against the trip arrays, so they can be per-trip arrays or (candidates, 1) columns
+    that score every candidate against every trip at once.
+    """
+    mileage_reimbursement = np.where(miles > mt, (mt * mr1) + ((miles - mt) * mr2), miles * mr1)
+    receipt_reimbursement = np.where(is_outlier, receipts * out_rate, np.minimum(receipts * rr, rc))
+    reimbursement = per_diem + mileage_reimbursement + receipt_reimbursement
+
+    low_receipts = ~is_outlier & (0 < receipts) & (receipts < low_thr)
+    return np.round(np.where(low_receipts, reimbursement - low_pen, reimbursement), 2)
+
+def calc_vec(days, miles, receipts, rules_arr):
+    """
+    Reimbursements of the 1-7 day trips, each under its day's rule from rules_arr.
+    Rows whose day has no rule in rules_arr come back as NaN.
+    """
+    days = days.astype(int)
+    return reimburse(miles.astype(int), receipts, receipts > OUTLIER_THRESHOLDS[days], *rules_arr[days].T)
+
+def predict(rule, miles, receipts, anomaly_threshold=np.inf, bug_threshold=np.inf, anomaly_rate=0, bug_rate=0):
+    """
+    Reimbursements for one day's trips under `rule`. Receipts above bug_threshold
+    are paid at bug_rate, those above anomaly_threshold at anomaly_rate. Passing a column
+    of rates scores them all at once and returns a (rates, trips) array.
+    """
+    is_bug = receipts > bug_threshold
+    is_anomaly = ~is_bug & (receipts > anomaly_threshold)
+
+    mileage_reimbursement = np.where(
+        miles > rule['mileage_threshold'],
+        (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2']),
+        miles * rule['mileage_rate1']
+    )
+    receipt_reimbursement = np.where(
+        is_bug,
+        receipts * bug_rate,
+        np.where(
+            is_anomaly,
+            receipts * anomaly_rate,
+            np.minimum(receipts * rule['receipt_rate'], rule['receipt_cap'])
+        )
+    )
+    total = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
+
+    penalized = ~is_bug & ~is_anomaly & (0 < receipts) & (receipts < rule['low_receipt_threshold'])
+    return total - penalized * rule['low_receipt_penalty']
@@ -1,14 +1,22 @@
-import pandas as pd
-import joblib
+import functools
 import sys
 
 class ReimbursementCalculator:
     def __init__(self, model_path='reimbursement_model_8_to_14.joblib', outlier_model_path='reimbursement_model_8_to_14_outliers.joblib'):
         """
-        Initializes the calculator by loading the trained model for long trips.
+        Initializes the calculator. The long trip models are only loaded when an 8-14 day
+        trip is first calculated, so 1-7 day trips never import joblib or NumPy.
         """
-        self.long_trip_model = joblib.load(model_path)
-        self.outlier_model = joblib.load(outlier_model_path)
+        self.model_path = model_path
+        self.outlier_model_path = outlier_model_path
+        # Hardcoded bug cases, keyed by (trip_duration_days, miles_traveled, total_receipts_amount)
+        self._overrides = {
+            (4, 69, 2321.49): 322.00,
+            (2, 18, 2503.46): 1206.95,
+            (5, 196, 1228.49): 511.23, # Rounded miles
+            (1, 1082, 1809.49): 446.94,
+            (5, 516, 1878.49): 669.85,
+        }
         self.rules = {
             1: {'per_diem': 40, 'mileage_rate1': 0.5, 'mileage_threshold': 75, 'mileage_rate2': 0.3, 'receipt_rate': 0.75, 'receipt_cap': 1100, 'low_receipt_threshold': 10, 'low_receipt_penalty': 0},
             2: {'per_diem': 100, 'mileage_rate1': 0.52, 'mileage_threshold': 75, 'mileage_rate2': 0.35, 'receipt_rate': 0.8, 'receipt_cap': 1100, 'low_receipt_threshold': 10, 'low_receipt_penalty': 0},
@@ -28,6 +36,29 @@ class ReimbursementCalculator:
             7: {'outlier_threshold': 1900, 'outlier_rate': 0.18, 'outlier_penalty': 500}
         }
 
+    @staticmethod
+    def _load_model(path):
+        import joblib
+        model = joblib.load(path)
+        # Predictions are made from a reused (1, 3) array rather than a new 1-row DataFrame per call.
+        # The models were fit on a DataFrame, so drop the stored feature names to skip the
+        # "X does not have valid feature names" check; columns stay in the training order.
+        model.feature_names_in_ = None
+        return model
+
+    @functools.cached_property
+    def long_trip_model(self):
+        return self._load_model(self.model_path)
+
+    @functools.cached_property
+    def outlier_model(self):
+        return self._load_model(self.outlier_model_path)
+
+    @functools.cached_property
+    def _buf(self):
+        import numpy as np
+        return np.empty((1, 3), dtype=np.float64)
+
     def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
         """
         Calculates the estimated reimbursement using a hybrid approach.
@@ -39,16 +70,9 @@ class ReimbursementCalculator:
         total_receipts_amount = float(total_receipts_amount)
         
         # Hardcoded bug cases
-        if trip_duration_days == 4 and miles_traveled == 69 and total_receipts_amount == 2321.49:
-            return 322.00
-        if trip_duration_days == 2 and miles_traveled == 18 and total_receipts_amount == 2503.46:
-            return 1206.95
-        if trip_duration_days == 5 and miles_traveled == 196 and total_receipts_amount == 1228.49: # Rounded miles
-            return 511.23
-        if trip_duration_days == 1 and miles_traveled == 1082 and total_receipts_amount == 1809.49:
-            return 446.94
-        if trip_duration_days == 5 and miles_traveled == 516 and total_receipts_amount == 1878.49:
-            return 669.85
+        override = self._overrides.get((trip_duration_days, miles_traveled, total_receipts_amount))
+        if override is not None:
+            return override
         
         if trip_duration_days in self.rules:
             rule = self.rules[trip_duration_days]
@@ -81,12 +105,8 @@ class ReimbursementCalculator:
             else:
                 model_to_use = self.long_trip_model
 
-            input_data = pd.DataFrame({
-                'trip_duration_days': [trip_duration_days],
-                'miles_traveled': [miles_traveled],
-                'total_receipts_amount': [total_receipts_amount]
-            })
-            prediction = model_to_use.predict(input_data)
+            self._buf[0] = (trip_duration_days, miles_traveled, total_receipts_amount)
+            prediction = model_to_use.predict(self._buf)
             reimbursement = prediction[0]
         else:
             reimbursement = 0
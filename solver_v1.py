@@ -1,61 +1,137 @@
 import pandas as pd
+import numpy as np
 import joblib
 import sys
-import json
-import itertools
-from sklearn.metrics import mean_absolute_error
+from scipy.optimize import minimize
+from numba import njit
+from data_io import load_cases, map_days, shrink, CASE_COLUMNS, OUTLIER_THRESHOLDS
+from rules import rules_to_array, reimburse, calc_vec
 
 class ReimbursementCalculator:
-    def __init__(self, rules, model_path='reimbursement_model_8_to_14.joblib'):
-        self.long_trip_model = joblib.load(model_path)
-        self.rules = rules
-
-    def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
-        trip_duration_days = int(trip_duration_days)
-        miles_traveled = int(miles_traveled)
-        total_receipts_amount = float(total_receipts_amount)
-        
-        is_outlier_case = False
-        if trip_duration_days == 1 and total_receipts_amount > 1900: is_outlier_case = True
-        elif trip_duration_days == 2 and total_receipts_amount > 1950: is_outlier_case = True
-        elif trip_duration_days == 3 and total_receipts_amount > 2100: is_outlier_case = True
-        elif trip_duration_days == 4 and total_receipts_amount > 2100: is_outlier_case = True
-        elif trip_duration_days == 5 and total_receipts_amount > 2200: is_outlier_case = True
-        elif trip_duration_days == 6 and total_receipts_amount > 2300: is_outlier_case = True
-        elif trip_duration_days == 7 and total_receipts_amount > 2400: is_outlier_case = True
-
-        if trip_duration_days in self.rules:
-            rule = self.rules[trip_duration_days]
-            per_diem = rule['per_diem']
-
-            if miles_traveled > rule['mileage_threshold']:
-                mileage_reimbursement = (rule['mileage_threshold'] * rule['mileage_rate1']) + \
-                                        ((miles_traveled - rule['mileage_threshold']) * rule['mileage_rate2'])
-            else:
-                mileage_reimbursement = miles_traveled * rule['mileage_rate1']
-
-            if is_outlier_case:
-                receipt_reimbursement = total_receipts_amount * 0.45
-            else:
-                receipt_reimbursement = min(total_receipts_amount * rule['receipt_rate'], rule['receipt_cap'])
-            
-            reimbursement = per_diem + mileage_reimbursement + receipt_reimbursement
-
-            if not is_outlier_case and 0 < total_receipts_amount < rule['low_receipt_threshold']:
-                reimbursement -= rule['low_receipt_penalty']
-
-        elif 8 <= trip_duration_days <= 14:
-            input_data = pd.DataFrame({
-                'trip_duration_days': [trip_duration_days],
-                'miles_traveled': [miles_traveled],
-                'total_receipts_amount': [total_receipts_amount]
-            })
-            prediction = self.long_trip_model.predict(input_data)
-            reimbursement = prediction[0]
+    def __init__(self, model_path='reimbursement_model_8_to_14.joblib', long_trip_model=None):
+        self.model_path = model_path
+        self._long_trip_model = long_trip_model
+
+    @property
+    def long_trip_model(self):
+        # Loaded on first use, so calculators built inside the search loops (1-7 day trips only)
+        # never unpickle the model.
+        if self._long_trip_model is None:
+            self._long_trip_model = joblib.load(self.model_path)
+        return self._long_trip_model
+
+
+@njit(cache=True, fastmath=True)
+def _calc_batch(days, miles, receipts, rules_arr, out_thresholds):
+    """
+    Compiled per-trip loop over the same formula as rules.reimburse(). The optimizer objective
+    calls it thousands of times on small arrays, where NumPy's temporaries dominate.
+    """
+    out = np.empty(len(days))
+    for i in range(len(days)):
+        day = int(days[i])
+        m = int(miles[i])
+        r = rules_arr[day]
+        per_diem, mr1, mt, mr2, rr, rc, low_thr, low_pen, out_rate = r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8]
+        is_outlier = receipts[i] > out_thresholds[day]
+
+        if m > mt:
+            mileage_reimbursement = (mt * mr1) + ((m - mt) * mr2)
+        else:
+            mileage_reimbursement = m * mr1
+
+        if is_outlier:
+            receipt_reimbursement = receipts[i] * out_rate
         else:
-            reimbursement = 0
+            receipt_reimbursement = min(receipts[i] * rr, rc)
+
+        reimbursement = per_diem + mileage_reimbursement + receipt_reimbursement
 
-        return round(reimbursement, 2)
+        if not is_outlier and 0 < receipts[i] < low_thr:
+            reimbursement -= low_pen
+
+        out[i] = round(reimbursement, 2)
+    return out
+
+
+def params_to_rule(x, mileage_threshold):
+    """
+    Builds a rule dict from the optimizer's (per_diem, mileage_rate1, mileage_rate2,
+    receipt_rate, receipt_cap) vector and a fixed mileage threshold.
+    """
+    per_diem, mr1, mr2, rr, rc = (float(v) for v in x)
+    return {
+        'per_diem': per_diem, 'mileage_rate1': mr1, 'mileage_threshold': mileage_threshold,
+        'mileage_rate2': mr2, 'receipt_rate': rr, 'receipt_cap': rc,
+        'low_receipt_threshold': 10, 'low_receipt_penalty': 0 # Keep these fixed for now
+    }
+
+
+def day_mae(x, mileage_threshold, days, miles, receipts, expected):
+    """
+    Objective for the optimizer: MAE of the rule built from x over one day's cases.
+    """
+    rules_arr = rules_to_array({int(days[0]): params_to_rule(x, mileage_threshold)})
+    return float(np.abs(_calc_batch(days, miles, receipts, rules_arr, OUTLIER_THRESHOLDS) - expected).mean())
+
+
+def batch_mae(candidates, mileage_threshold, miles, receipts, expected, out_thr):
+    """
+    MAE over one day's cases of every (per_diem, mileage_rate1, mileage_rate2, receipt_rate,
+    receipt_cap) row of candidates, evaluated as a single (candidates, cases) array.
+    """
+    per_diem, mr1, mr2, rr, rc = (col[:, None] for col in candidates.T)
+    predicted = reimburse(
+        miles.astype(int), receipts, receipts > out_thr,
+        per_diem, mr1, mileage_threshold, mr2, rr, rc, 10, 0, 0.45 # Low-receipt rule fixed as in params_to_rule
+    )
+    return np.abs(predicted - expected).mean(axis=1)
+
+
+def optimize_day(day, days, miles, receipts, expected, rule):
+    """
+    Optimizes the rule for one trip duration against its bad cases.
+    Returns (day, best_params, best_mae).
+    """
+    # Search bounds match the ranges of the old Cartesian grid
+    bounds = [
+        (day * 30, day * 150),  # per_diem
+        (0.3, 0.8),             # mileage_rate1
+        (0.2, 0.6),             # mileage_rate2
+        (0.4, 0.9),             # receipt_rate
+        (800, 1600),            # receipt_cap
+    ]
+    x0 = np.clip(
+        [rule['per_diem'], rule['mileage_rate1'], rule['mileage_rate2'], rule['receipt_rate'], rule['receipt_cap']],
+        [low for low, _ in bounds], [high for _, high in bounds]
+    )
+
+    best_mae = float('inf')
+    best_params = None
+
+    # A coarse grid over the same ranges, used to seed Powell alongside the solution.py rule
+    seed_axes = [
+        np.linspace(day * 30, day * 150, 7), [0.3, 0.5, 0.7], [0.3, 0.45], [0.5, 0.7, 0.9], [900, 1200, 1500]
+    ]
+    seed_grid = np.stack(np.meshgrid(*seed_axes, indexing='ij'), axis=-1).reshape(-1, len(seed_axes))
+    day_out_thr = OUTLIER_THRESHOLDS[day]
+
+    # The mileage threshold only takes a few values, so it is scanned; the other five
+    # parameters are continuous and optimized with Powell.
+    for mt in [50, 75, 100, 125, 150]:
+        args = (mt, days, miles, receipts, expected)
+
+        # The whole seed grid is scored in one (candidates, cases) broadcast
+        seed = seed_grid[batch_mae(seed_grid, mt, miles, receipts, expected, day_out_thr).argmin()]
+
+        for start in (x0, seed):
+            result = minimize(day_mae, start, args=args, method='Powell', bounds=bounds)
+
+            if result.fun < best_mae:
+                best_mae = result.fun
+                best_params = params_to_rule(result.x, mt)
+
+    return day, best_params, best_mae
 
 
 def solve_bad_cases():
@@ -63,13 +139,7 @@ def solve_bad_cases():
     Identifies high-error cases and iterates on parameters to find a better fit.
     """
     # Load data
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df = pd.DataFrame([d for d in data])
-    df_input = pd.json_normalize(df['input'])
-    df = pd.concat([df.drop(['input'], axis=1), df_input], axis=1)
-    df = df.astype(float)
+    df = shrink(pd.DataFrame(load_cases(), columns=CASE_COLUMNS))
 
     # Initial rules from solution.py
     initial_rules = {
@@ -83,62 +153,42 @@ def solve_bad_cases():
     }
 
     # Calculate initial error
-    calculator = ReimbursementCalculator(rules=initial_rules)
-    df['actual_output'] = df.apply(lambda row: calculator.calculate(row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']), axis=1)
+    calculator = ReimbursementCalculator()
+    days = df['trip_duration_days'].to_numpy()
+    actual_output = calc_vec(days, df['miles_traveled'].to_numpy(), df['total_receipts_amount'].to_numpy(), rules_to_array(initial_rules))
+
+    long_trips = (8 <= days) & (days <= 14)
+    if long_trips.any():
+        long_trip_input = df.loc[long_trips, ['trip_duration_days', 'miles_traveled', 'total_receipts_amount']].astype(
+            {'trip_duration_days': int, 'miles_traveled': int}
+        )
+        actual_output[long_trips] = np.round(calculator.long_trip_model.predict(long_trip_input), 2)
+    df['actual_output'] = np.nan_to_num(actual_output)
     df['error'] = df['actual_output'] - df['expected_output']
     
     # Isolate bad cases (for trips 1-7 days)
     bad_cases = df[(df['error'].abs() > 1) & (df['trip_duration_days'] <= 7)].copy()
     print(f"Found {len(bad_cases)} bad cases (error > $1) for 1-7 day trips to optimize.")
 
-    final_rules = {}
+    day_groups = [
+        (day, group) for day in range(1, 8)
+        if not (group := bad_cases[bad_cases['trip_duration_days'] == day]).empty
+    ]
+    results = map_days(optimize_day, [
+        (
+            day,
+            group['trip_duration_days'].to_numpy(),
+            group['miles_traveled'].to_numpy(),
+            group['total_receipts_amount'].to_numpy(),
+            group['expected_output'].to_numpy(),
+            initial_rules[day],
+        )
+        for day, group in day_groups
+    ])
 
-    for day in range(1, 8):
-        day_cases = bad_cases[bad_cases['trip_duration_days'] == day].copy()
-        if day_cases.empty:
-            continue
-
-        print(f"\n--- Optimizing for {len(day_cases)} bad cases for {day}-day trips ---")
-
-        # Define parameter search grid
-        per_diems = range(int(day * 30), int(day * 150), 10)
-        mileage_rate1s = [x / 100 for x in range(30, 81, 2)]
-        mileage_thresholds = [50, 75, 100, 125, 150]
-        mileage_rate2s = [x / 100 for x in range(20, 61, 5)]
-        receipt_rates = [x / 100 for x in range(40, 91, 5)]
-        receipt_caps = range(800, 1601, 100)
-        
-        # Reduced grid for faster iteration
-        param_grid = list(itertools.product(
-            per_diems, mileage_rate1s, [100], mileage_rate2s,
-            receipt_rates, receipt_caps
-        ))
-
-        best_mae = float('inf')
-        best_params = None
-
-        # This part is slow, will replace with a more efficient search or parallelize later
-        for params in param_grid:
-            pd, mr1, mt, mr2, rr, rc = params
-            
-            temp_rules = {day: {
-                'per_diem': pd, 'mileage_rate1': mr1, 'mileage_threshold': mt, 
-                'mileage_rate2': mr2, 'receipt_rate': rr, 'receipt_cap': rc,
-                'low_receipt_threshold': 10, 'low_receipt_penalty': 0 # Keep these fixed for now
-            }}
-            
-            calculator = ReimbursementCalculator(rules=temp_rules)
-            
-            predicted_output = day_cases.apply(lambda row: calculator.calculate(
-                row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']
-            ), axis=1)
-            
-            mae = mean_absolute_error(day_cases['expected_output'], predicted_output)
-
-            if mae < best_mae:
-                best_mae = mae
-                best_params = temp_rules[day]
-        
+    final_rules = {}
+    for (day, best_params, best_mae), (_, group) in zip(results, day_groups):
+        print(f"\n--- Optimized {len(group)} bad cases for {day}-day trips ---")
         final_rules[day] = best_params
         print(f"Best MAE for day {day}: ${best_mae:.2f}")
         print(f"Optimal parameters for day {day}: {best_params}")
@@ -1,75 +1,14 @@
-import json
 import pandas as pd
 import numpy as np
-import itertools
-from sklearn.metrics import mean_absolute_error
-from joblib import Parallel, delayed
-import joblib
-
-# Re-using the class structure from solution.py for consistency
-class ReimbursementCalculator:
-    def __init__(self, rules, model_path='reimbursement_model_8_to_14.joblib'):
-        self.long_trip_model = joblib.load(model_path)
-        self.rules = rules
-
-    def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
-        # This function will be called repeatedly by the solver
-        # with different rule sets.
-        day = int(trip_duration_days)
-        miles = int(miles_traveled)
-        receipts = float(total_receipts_amount)
-
-        if day not in self.rules:
-            return 0 # Should not happen in this script
-
-        rule = self.rules[day]
-        
-        is_outlier = False
-        if day == 1 and receipts > 1900: is_outlier = True
-        elif day == 2 and receipts > 1950: is_outlier = True
-        elif day == 3 and receipts > 2100: is_outlier = True
-        elif day == 4 and receipts > 2100: is_outlier = True
-        elif day == 5 and receipts > 2200: is_outlier = True
-        elif day == 6 and receipts > 2300: is_outlier = True
-        elif day == 7 and receipts > 2400: is_outlier = True
-
-        if miles > rule['mileage_threshold']:
-            mileage_reimbursement = (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2'])
-        else:
-            mileage_reimbursement = miles * rule['mileage_rate1']
-
-        if is_outlier:
-            receipt_reimbursement = receipts * rule.get('outlier_receipt_rate', 0.45) # Use a new outlier rate
-        else:
-            receipt_reimbursement = min(receipts * rule['receipt_rate'], rule['receipt_cap'])
-            
-        reimbursement = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
-        
-        if not is_outlier and 0 < receipts < rule['low_receipt_threshold']:
-            reimbursement -= rule['low_receipt_penalty']
-            
-        return round(reimbursement, 2)
-
+from data_io import load_cases, shrink, CASE_COLUMNS, OUTLIER_THRESHOLDS
+from rules import RULE_COLUMNS, rules_to_array, reimburse, calc_vec
 
 def run_solver():
     """
     Finds the optimal 'outlier_receipt_rate' for each day by focusing only 
     on the high-error outlier cases for that specific day.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df_full = pd.json_normalize(data)
-    df_full.rename(columns={
-        'input.trip_duration_days': 'trip_duration_days',
-        'input.miles_traveled': 'miles_traveled',
-        'input.total_receipts_amount': 'total_receipts_amount'
-    }, inplace=True)
-    
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output']:
-        df_full[col] = pd.to_numeric(df_full[col], errors='coerce')
-
-    df_full.dropna(inplace=True)
+    df_full = shrink(pd.DataFrame(load_cases(), columns=CASE_COLUMNS))
 
     current_rules = {
         1: {'per_diem': 40, 'mileage_rate1': 0.5, 'mileage_threshold': 75, 'mileage_rate2': 0.3, 'receipt_rate': 0.75, 'receipt_cap': 1100, 'low_receipt_threshold': 10, 'low_receipt_penalty': 0, 'outlier_receipt_rate': 0.45},
@@ -81,22 +20,12 @@ def run_solver():
         7: {'per_diem': 490, 'mileage_rate1': 0.64, 'mileage_threshold': 125, 'mileage_rate2': 0.5, 'receipt_rate': 0.8, 'receipt_cap': 900, 'low_receipt_threshold': 10, 'low_receipt_penalty': 0, 'outlier_receipt_rate': 0.45},
     }
     
-    def is_outlier(row):
-        day = row['trip_duration_days']
-        receipts = row['total_receipts_amount']
-        if day == 1 and receipts > 1900: return True
-        if day == 2 and receipts > 1950: return True
-        if day == 3 and receipts > 2100: return True
-        if day == 4 and receipts > 2100: return True
-        if day == 5 and receipts > 2200: return True
-        if day == 6 and receipts > 2300: return True
-        if day == 7 and receipts > 2400: return True
-        return False
-        
-    df_full['is_outlier'] = df_full.apply(is_outlier, axis=1)
+    days = df_full['trip_duration_days'].to_numpy()
+    receipts = df_full['total_receipts_amount'].to_numpy()
+    df_full['is_outlier'] = receipts > OUTLIER_THRESHOLDS[days.astype(int)]
     
-    calculator = ReimbursementCalculator(rules=current_rules)
-    df_full['actual_output'] = df_full.apply(lambda row: calculator.calculate(row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']), axis=1)
+    # Days without a rule (8-14) are left at 0
+    df_full['actual_output'] = np.nan_to_num(calc_vec(days, df_full['miles_traveled'].to_numpy(), receipts, rules_to_array(current_rules)))
     df_full['error'] = df_full['actual_output'] - df_full['expected_output']
 
     final_outlier_rates = {}
@@ -111,24 +40,20 @@ def run_solver():
 
         print(f"\nFound {len(failing_outliers_day)} failing 'bug' cases to optimize for day {day}.")
 
-        best_mae = float('inf')
-        best_rate = 0
-        
-        for rate in [x / 100 for x in range(0, 101, 1)]:
-            temp_rules = current_rules.copy()
-            temp_rules[day]['outlier_receipt_rate'] = rate
-                
-            calc = ReimbursementCalculator(rules=temp_rules)
-            
-            predicted = failing_outliers_day.apply(lambda row: calc.calculate(
-                row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']
-            ), axis=1)
-            
-            mae = mean_absolute_error(failing_outliers_day['expected_output'], predicted)
+        # Every case here is an outlier, so only the outlier rate varies; passing the
+        # candidate rates as a column scores them all in one (rates, cases) array.
+        rule = current_rules[day]
+        miles = failing_outliers_day['miles_traveled'].to_numpy().astype(int)
+        receipts = failing_outliers_day['total_receipts_amount'].to_numpy()
+        expected = failing_outliers_day['expected_output'].to_numpy()
+
+        rates = np.arange(0, 101) / 100
+        rule_values = [rule[col] for col in RULE_COLUMNS[:-1]]
+        predicted = reimburse(miles, receipts, np.ones(len(miles), dtype=bool), *rule_values, rates[:, None])
+        mae = np.abs(predicted - expected).mean(axis=1)
 
-            if mae < best_mae:
-                best_mae = mae
-                best_rate = rate
+        best_index = mae.argmin()
+        best_mae, best_rate = mae[best_index], float(rates[best_index])
         
         final_outlier_rates[day] = best_rate
         print(f"--- Day {day} Optimization Complete ---")
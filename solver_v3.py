@@ -1,48 +1,66 @@
-import json
 import pandas as pd
 import numpy as np
-import itertools
-from sklearn.metrics import mean_absolute_error
-from joblib import Parallel, delayed
-import joblib
-
-# Re-using the class structure from solution.py for consistency
-class ReimbursementCalculator:
-    def __init__(self, rules, outlier_thresholds):
-        self.long_trip_model = joblib.load('reimbursement_model_8_to_14.joblib')
-        self.rules = rules
-        self.outlier_thresholds = outlier_thresholds
-
-    def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
-        # This function will be called repeatedly by the solver
-        # with different rule sets.
-        day = int(trip_duration_days)
-        miles = int(miles_traveled)
-        receipts = float(total_receipts_amount)
-
-        if day not in self.rules:
-            return 0 # Should not happen in this script
-
-        rule = self.rules[day]
-        
-        is_outlier = receipts > self.outlier_thresholds.get(day, float('inf'))
-
-        if miles > rule['mileage_threshold']:
-            mileage_reimbursement = (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2'])
-        else:
-            mileage_reimbursement = miles * rule['mileage_rate1']
-
-        if is_outlier:
-            receipt_reimbursement = receipts * rule.get('outlier_receipt_rate', 0.45) # Use a new outlier rate
-        else:
-            receipt_reimbursement = min(receipts * rule['receipt_rate'], rule['receipt_cap'])
-            
-        reimbursement = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
-        
-        if not is_outlier and 0 < receipts < rule['low_receipt_threshold']:
-            reimbursement -= rule['low_receipt_penalty']
-            
-        return round(reimbursement, 2)
+from data_io import load_cases, map_days, best_grid_rate, CASE_COLUMNS
+
+
+def predict(rule, miles, receipts, outlier_threshold=np.inf, outlier_rate=0.45):
+    """
+    Reimbursements for one day's trips under `rule`, with receipts above
+    outlier_threshold paid at outlier_rate. Passing a column of rates scores them all
+    at once and returns a (rates, trips) array.
+    """
+    is_outlier = receipts > outlier_threshold
+
+    mileage_reimbursement = np.where(
+        miles > rule['mileage_threshold'],
+        (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2']),
+        miles * rule['mileage_rate1']
+    )
+    receipt_reimbursement = np.where(
+        is_outlier,
+        receipts * outlier_rate,
+        np.minimum(receipts * rule['receipt_rate'], rule['receipt_cap'])
+    )
+    total = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
+
+    penalized = ~is_outlier & (0 < receipts) & (receipts < rule['low_receipt_threshold'])
+    return total - penalized * rule['low_receipt_penalty']
+
+
+def calculate_vec(rules, outlier_thresholds, days, miles, receipts):
+    """
+    Rounded reimbursements for arrays of trips, each under its day's rule and
+    outlier threshold. Days without a rule come back as 0.
+    """
+    days = np.asarray(days).astype(int)
+    miles = np.asarray(miles).astype(int)
+    receipts = np.asarray(receipts, dtype=float)
+    reimbursement = np.zeros(len(days))
+
+    for day in np.unique(days).tolist():
+        if day not in rules:
+            continue # Should not happen in this script
+
+        rows = days == day
+        rule = rules[day]
+        reimbursement[rows] = predict(
+            rule, miles[rows], receipts[rows],
+            outlier_thresholds.get(day, np.inf), rule.get('outlier_receipt_rate', 0.45) # Use a new outlier rate
+        )
+
+    return np.round(reimbursement, 2)
+
+
+def optimize_day(day, rule, outlier_threshold, miles, receipts, expected):
+    """
+    Finds the outlier receipt rate that minimizes the MAE over one day's outlier cases.
+    Returns (day, best_rate, best_mae).
+    """
+    rates = np.arange(0, 101) / 100
+    # Every case here is an outlier, so a zero rate leaves just the per diem and mileage
+    base = predict(rule, miles, receipts, outlier_threshold, 0)
+    best_rate, best_mae = best_grid_rate(base, receipts, expected, rates)
+    return day, best_rate, best_mae
 
 
 def run_solver():
@@ -50,20 +68,7 @@ def run_solver():
     Finds the optimal 'outlier_receipt_rate' for each day by focusing only 
     on the high-error outlier cases for that specific day.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df_full = pd.json_normalize(data)
-    df_full.rename(columns={
-        'input.trip_duration_days': 'trip_duration_days',
-        'input.miles_traveled': 'miles_traveled',
-        'input.total_receipts_amount': 'total_receipts_amount'
-    }, inplace=True)
-    
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output']:
-        df_full[col] = pd.to_numeric(df_full[col], errors='coerce')
-
-    df_full.dropna(inplace=True)
+    df_full = pd.DataFrame(load_cases(), columns=CASE_COLUMNS)
 
     # These are the original rules, we will use them as a base
     current_rules = {
@@ -87,25 +92,37 @@ def run_solver():
         7: 2300,
     }
     
-    def is_outlier(row):
-        day = row['trip_duration_days']
-        receipts = row['total_receipts_amount']
-        return receipts > outlier_thresholds.get(day, float('inf'))
-        
-    df_full['is_outlier'] = df_full.apply(is_outlier, axis=1)
+    thresholds = df_full['trip_duration_days'].map(outlier_thresholds).fillna(np.inf).to_numpy()
+    df_full['is_outlier'] = df_full['total_receipts_amount'].to_numpy() > thresholds
     
-    # Initialize a calculator for the initial error calculation
+    # The initial error is calculated with the old outlier rate
     initial_calc_rules = {day: {**rule, 'outlier_receipt_rate': 0.45} for day, rule in current_rules.items()}
-    calculator = ReimbursementCalculator(rules=initial_calc_rules, outlier_thresholds=outlier_thresholds)
-    df_full['actual_output'] = df_full.apply(lambda row: calculator.calculate(row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']), axis=1)
+    df_full['actual_output'] = calculate_vec(
+        initial_calc_rules, outlier_thresholds,
+        df_full['trip_duration_days'].to_numpy(), df_full['miles_traveled'].to_numpy(), df_full['total_receipts_amount'].to_numpy()
+    )
     df_full['error'] = df_full['actual_output'] - df_full['expected_output']
 
     final_outlier_rates = {}
 
-    for day in range(1, 8):
-        # We now optimize over all identified outliers for the day
-        outliers_day = df_full[(df_full['is_outlier']) & (df_full['trip_duration_days'] == day)].copy()
-        
+    # We now optimize over all identified outliers for the day
+    outlier_groups = dict(tuple(df_full[df_full['is_outlier']].groupby('trip_duration_days')))
+    outliers_by_day = {day: outlier_groups.get(day, df_full.iloc[:0]) for day in range(1, 8)}
+
+    results = map_days(optimize_day, [
+        (
+            day,
+            current_rules[day],
+            outlier_thresholds[day],
+            outliers_day['miles_traveled'].to_numpy().astype(int),
+            outliers_day['total_receipts_amount'].to_numpy(),
+            outliers_day['expected_output'].to_numpy(),
+        )
+        for day, outliers_day in outliers_by_day.items() if not outliers_day.empty
+    ])
+    results = {day: (best_rate, best_mae) for day, best_rate, best_mae in results}
+
+    for day, outliers_day in outliers_by_day.items():
         if outliers_day.empty:
             print(f"\nNo bug cases to optimize for day {day}.")
             # If no outliers, rate doesn't matter, but we can set a default.
@@ -114,24 +131,7 @@ def run_solver():
 
         print(f"\nFound {len(outliers_day)} 'bug' cases to optimize for day {day}.")
 
-        best_mae = float('inf')
-        best_rate = 0
-        
-        for rate in [x / 100 for x in range(0, 101, 1)]:
-            temp_rules = current_rules.copy()
-            temp_rules[day]['outlier_receipt_rate'] = rate
-                
-            calc = ReimbursementCalculator(rules=temp_rules, outlier_thresholds=outlier_thresholds)
-            
-            predicted = outliers_day.apply(lambda row: calc.calculate(
-                row['trip_duration_days'], row['miles_traveled'], row['total_receipts_amount']
-            ), axis=1)
-            
-            mae = mean_absolute_error(outliers_day['expected_output'], predicted)
-
-            if mae < best_mae:
-                best_mae = mae
-                best_rate = rate
+        best_rate, best_mae = results[day]
         
         final_outlier_rates[day] = best_rate
         print(f"--- Day {day} Optimization Complete ---")
@@ -2,9 +2,9 @@ import json
 import pandas as pd
 import numpy as np
 import itertools
-from sklearn.metrics import mean_absolute_error
 from joblib import Parallel, delayed
 import joblib
+from data_io import mean_abs_error
 
 # Re-using the class structure from solution.py for consistency
 class ReimbursementCalculator:
@@ -112,7 +112,7 @@ def run_solver():
                         params = {day: {'anomaly_threshold': anomaly_thresh, 'bug_threshold': bug_thresh, 'anomaly_rate': rate}}
                         calc = ReimbursementCalculator(rules=current_rules, params=params)
                         predicted = df_anomalies.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                        mae = mean_absolute_error(df_anomalies['expected_output'], predicted)
+                        mae = mean_abs_error(df_anomalies['expected_output'], predicted)
                         if mae < best_anomaly_mae:
                             best_anomaly_mae = mae
                             best_anomaly_rate = rate
@@ -124,7 +124,7 @@ def run_solver():
                         params = {day: {'anomaly_threshold': anomaly_thresh, 'bug_threshold': bug_thresh, 'bug_rate': rate}}
                         calc = ReimbursementCalculator(rules=current_rules, params=params)
                         predicted = df_bugs.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                        mae = mean_absolute_error(df_bugs['expected_output'], predicted)
+                        mae = mean_abs_error(df_bugs['expected_output'], predicted)
                         if mae < best_bug_mae:
                             best_bug_mae = mae
                             best_bug_rate = rate
@@ -133,7 +133,7 @@ def run_solver():
                 current_params = {day: {'anomaly_threshold': anomaly_thresh, 'bug_threshold': bug_thresh, 'anomaly_rate': best_anomaly_rate, 'bug_rate': best_bug_rate}}
                 calc = ReimbursementCalculator(rules=current_rules, params=current_params)
                 predicted = df_day.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                total_mae = mean_absolute_error(df_day['expected_output'], predicted)
+                total_mae = mean_abs_error(df_day['expected_output'], predicted)
 
                 if total_mae < best_day_mae:
                     best_day_mae = total_mae
@@ -1,55 +1,99 @@
-import json
 import pandas as pd
 import numpy as np
-import itertools
-from sklearn.metrics import mean_absolute_error
-from joblib import Parallel, delayed
-import joblib
-
-# Re-using the class structure from solution.py for consistency
-class ReimbursementCalculator:
-    def __init__(self, rules, params):
-        self.long_trip_model = joblib.load('reimbursement_model_8_to_14.joblib')
-        self.rules = rules
-        self.params = params
-
-    def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
-        # This function will be called repeatedly by the solver
-        # with different rule sets.
-        day = int(trip_duration_days)
-        miles = int(miles_traveled)
-        receipts = float(total_receipts_amount)
-
-        if day not in self.rules:
-            return 0 # Should not happen in this script
-
-        rule = self.rules[day]
-        day_params = self.params.get(day, {})
-        
-        anomaly_threshold = day_params.get('anomaly_threshold', float('inf'))
-        bug_threshold = day_params.get('bug_threshold', float('inf'))
-        
-        is_bug = receipts > bug_threshold
-        is_anomaly = not is_bug and receipts > anomaly_threshold
-
-        if miles > rule['mileage_threshold']:
-            mileage_reimbursement = (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2'])
+from numba import njit
+from rules import predict
+from data_io import load_cases, day_arrays, map_days, best_grid_rate, CASE_COLUMNS
+
+# Define a fixed threshold for "bug" cases
+BUG_THRESHOLD = 2500
+BUG_RATE = 0.005 # A near-zero rate for bug cases
+
+
+@njit(cache=True, fastmath=True)
+def _day_mae(miles, receipts, expected, per_diem, mr1, mt, mr2, rr, rc, low_thr, low_pen,
+             anomaly_threshold, bug_threshold, anomaly_rate, bug_rate):
+    """
+    Compiled MAE of predict() over one day's trips, accumulated case by case
+    without building the array of predictions. It runs serially: the days are
+    already spread over the loky worker processes.
+    """
+    total_error = 0.0
+    for i in range(len(miles)):
+        m = miles[i]
+        r = receipts[i]
+
+        if m > mt:
+            reimbursement = per_diem + (mt * mr1) + ((m - mt) * mr2)
         else:
-            mileage_reimbursement = miles * rule['mileage_rate1']
+            reimbursement = per_diem + m * mr1
 
-        if is_bug:
-            receipt_reimbursement = receipts * day_params.get('bug_rate', 0)
-        elif is_anomaly:
-            receipt_reimbursement = receipts * day_params.get('anomaly_rate', 0)
+        if r > bug_threshold:
+            reimbursement += r * bug_rate
+        elif r > anomaly_threshold:
+            reimbursement += r * anomaly_rate
         else:
-            receipt_reimbursement = min(receipts * rule['receipt_rate'], rule['receipt_cap'])
-            
-        reimbursement = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
-        
-        if not is_bug and not is_anomaly and 0 < receipts < rule['low_receipt_threshold']:
-            reimbursement -= rule['low_receipt_penalty']
-            
-        return round(reimbursement, 2)
+            reimbursement += min(r * rr, rc)
+            if 0 < r < low_thr:
+                reimbursement -= low_pen
+
+        total_error += abs(reimbursement - expected[i])
+    return total_error / len(miles)
+
+
+def optimize_day(day, miles, receipts, expected, rule):
+    """
+    Searches the anomaly threshold and rate for one day, with bugs fixed at BUG_THRESHOLD.
+    Returns (day, best_day_params, improvements), where improvements lists every
+    (mae, params) that beat the best so far, in search order.
+    """
+    # Trips are sorted by receipts so that every threshold split is a contiguous slice
+    order = np.argsort(receipts, kind='stable')
+    miles, receipts, expected = miles[order], receipts[order], expected[order]
+
+    # Separate the bug cases first; everything before bug_start is a non-bug
+    bug_start = np.searchsorted(receipts, BUG_THRESHOLD, side='right')
+
+    best_day_mae = float('inf')
+    best_day_params = {
+        'bug_threshold': BUG_THRESHOLD,
+        'bug_rate': BUG_RATE,
+        'anomaly_threshold': -1, # Using -1 to signify no anomaly found yet
+        'anomaly_rate': -1
+    }
+    improvements = []
+
+    anomaly_threshold_search = np.arange(1000, BUG_THRESHOLD, 200)
+    anomaly_rate_search = np.arange(30, 76, 2) / 100
+
+    for anomaly_thresh in anomaly_threshold_search:
+        # Anomalies are cases above the current threshold but below the bug threshold
+        start = np.searchsorted(receipts, anomaly_thresh, side='right')
+        if start >= bug_start:
+            continue
+        anomalies = slice(start, bug_start)
+
+        # Every case in the slice is an anomaly, so a zero rate leaves just the per diem and mileage
+        base = predict(rule, miles[anomalies], receipts[anomalies], anomaly_threshold=anomaly_thresh, anomaly_rate=0)
+        best_anomaly_rate, _ = best_grid_rate(base, receipts[anomalies], expected[anomalies], anomaly_rate_search)
+
+        # Now, calculate the total MAE for the day with this set of parameters
+        # for anomalies and the fixed parameters for bugs
+        total_mae = _day_mae(
+            miles, receipts, expected,
+            rule['per_diem'], rule['mileage_rate1'], rule['mileage_threshold'], rule['mileage_rate2'],
+            rule['receipt_rate'], rule['receipt_cap'], rule['low_receipt_threshold'], rule['low_receipt_penalty'],
+            float(anomaly_thresh), float(BUG_THRESHOLD), best_anomaly_rate, BUG_RATE
+        )
+
+        if total_mae < best_day_mae:
+            best_day_mae = total_mae
+            best_day_params.update({
+                'anomaly_threshold': anomaly_thresh,
+                'anomaly_rate': best_anomaly_rate,
+            })
+            improvements.append((total_mae, dict(best_day_params)))
+
+    return day, best_day_params, improvements
 
 
 def run_solver():
@@ -57,20 +101,7 @@ def run_solver():
     Finds the optimal 'outlier_receipt_rate' for each day by focusing only 
     on the high-error outlier cases for that specific day.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df_full = pd.json_normalize(data)
-    df_full.rename(columns={
-        'input.trip_duration_days': 'trip_duration_days',
-        'input.miles_traveled': 'miles_traveled',
-        'input.total_receipts_amount': 'total_receipts_amount'
-    }, inplace=True)
-    
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output']:
-        df_full[col] = pd.to_numeric(df_full[col], errors='coerce')
-
-    df_full.dropna(inplace=True)
+    df_full = pd.DataFrame(load_cases(), columns=CASE_COLUMNS)
 
     # These are the original rules, we will use them as a base
     current_rules = {
@@ -84,75 +115,15 @@ def run_solver():
     }
 
     final_params = {}
-    
-    # Define a fixed threshold for "bug" cases
-    BUG_THRESHOLD = 2500
-    BUG_RATE = 0.005 # A near-zero rate for bug cases
-
-    for day in range(1, 8):
-        df_day = df_full[df_full['trip_duration_days'] == day].copy()
-        if df_day.empty:
-            continue
-            
+
+    by_day = day_arrays(df_full)
+    results = map_days(optimize_day, [(day, *by_day[day], current_rules[day]) for day in range(1, 8) if day in by_day])
+
+    for day, best_day_params, improvements in results:
         print(f"\n--- Optimizing for Day {day} ---")
+        for total_mae, params in improvements:
+            print(f"  New best MAE for day {day}: ${total_mae:.2f} with params: {params}")
 
-        # Separate the bug cases first
-        df_bugs = df_day[df_day['total_receipts_amount'] > BUG_THRESHOLD]
-        df_non_bugs = df_day[df_day['total_receipts_amount'] <= BUG_THRESHOLD]
-
-        best_day_mae = float('inf')
-        best_day_params = {
-            'bug_threshold': BUG_THRESHOLD,
-            'bug_rate': BUG_RATE,
-            'anomaly_threshold': -1, # Using -1 to signify no anomaly found yet
-            'anomaly_rate': -1
-        }
-
-        anomaly_threshold_search = np.arange(1000, BUG_THRESHOLD, 200)
-        anomaly_rate_search = [x / 100 for x in range(30, 76, 2)]
-
-        for anomaly_thresh in anomaly_threshold_search:
-            # Anomalies are cases above the current threshold but below the bug threshold
-            df_anomalies = df_non_bugs[df_non_bugs['total_receipts_amount'] > anomaly_thresh]
-            
-            if df_anomalies.empty:
-                continue
-
-            best_anomaly_rate = 0
-            best_anomaly_mae = float('inf')
-
-            for rate in anomaly_rate_search:
-                params = {day: {'anomaly_threshold': anomaly_thresh, 'anomaly_rate': rate}}
-                calc = ReimbursementCalculator(rules=current_rules, params=params)
-                predicted = df_anomalies.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                mae = mean_absolute_error(df_anomalies['expected_output'], predicted)
-                if mae < best_anomaly_mae:
-                    best_anomaly_mae = mae
-                    best_anomaly_rate = rate
-            
-            # Now, calculate the total MAE for the day with this set of parameters
-            # for anomalies and the fixed parameters for bugs
-            temp_params = {
-                day: {
-                    'anomaly_threshold': anomaly_thresh,
-                    'anomaly_rate': best_anomaly_rate,
-                    'bug_threshold': BUG_THRESHOLD,
-                    'bug_rate': BUG_RATE
-                }
-            }
-            
-            calc = ReimbursementCalculator(rules=current_rules, params=temp_params)
-            predicted = df_day.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-            total_mae = mean_absolute_error(df_day['expected_output'], predicted)
-
-            if total_mae < best_day_mae:
-                best_day_mae = total_mae
-                best_day_params.update({
-                    'anomaly_threshold': anomaly_thresh,
-                    'anomaly_rate': best_anomaly_rate,
-                })
-                print(f"  New best MAE for day {day}: ${total_mae:.2f} with params: {best_day_params}")
-        
         final_params[day] = best_day_params
 
     print("\n\n--- Final Optimized Parameters ---")
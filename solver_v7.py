@@ -1,55 +1,57 @@
-import json
 import pandas as pd
 import numpy as np
-import itertools
-from sklearn.metrics import mean_absolute_error
-from joblib import Parallel, delayed
-import joblib
-
-# Re-using the class structure from solution.py for consistency
-class ReimbursementCalculator:
-    def __init__(self, rules, params):
-        self.long_trip_model = joblib.load('reimbursement_model_8_to_14.joblib')
-        self.rules = rules
-        self.params = params
-
-    def calculate(self, trip_duration_days, miles_traveled, total_receipts_amount):
-        # This function will be called repeatedly by the solver
-        # with different rule sets.
-        day = int(trip_duration_days)
-        miles = int(miles_traveled)
-        receipts = float(total_receipts_amount)
-
-        if day not in self.rules:
-            return 0 # Should not happen in this script
-
-        rule = self.rules[day]
-        day_params = self.params.get(day, {})
-        
-        anomaly_threshold = day_params.get('anomaly_threshold', float('inf'))
-        bug_threshold = day_params.get('bug_threshold', float('inf'))
-        
-        is_bug = receipts > bug_threshold
-        is_anomaly = not is_bug and receipts > anomaly_threshold
-
-        if miles > rule['mileage_threshold']:
-            mileage_reimbursement = (rule['mileage_threshold'] * rule['mileage_rate1']) + ((miles - rule['mileage_threshold']) * rule['mileage_rate2'])
-        else:
-            mileage_reimbursement = miles * rule['mileage_rate1']
-
-        if is_bug:
-            receipt_reimbursement = receipts * day_params.get('bug_rate', 0)
-        elif is_anomaly:
-            receipt_reimbursement = receipts * day_params.get('anomaly_rate', 0)
-        else:
-            receipt_reimbursement = min(receipts * rule['receipt_rate'], rule['receipt_cap'])
-            
-        reimbursement = rule['per_diem'] + mileage_reimbursement + receipt_reimbursement
-        
-        if not is_bug and not is_anomaly and 0 < receipts < rule['low_receipt_threshold']:
-            reimbursement -= rule['low_receipt_penalty']
-            
-        return round(reimbursement, 2)
+from rules import predict
+from data_io import load_cases, day_arrays, map_days, CASE_COLUMNS
+
+
+def optimize_day(day, miles, receipts, expected, rule):
+    """
+    Derives the anomaly/bug thresholds for one day from its largest receipts, then
+    fits the anomaly rate. Returns (day, params).
+    """
+    # --- Data-Driven Threshold Detection ---
+    receipts_sorted = np.sort(receipts)[::-1]
+    top_5_percent_index = int(len(receipts_sorted) * 0.05)
+
+    if top_5_percent_index < 2: # Ensure we have enough data points
+         if len(receipts_sorted) > 1:
+             bug_threshold = receipts_sorted[0]
+             anomaly_threshold = receipts_sorted[1]
+         else: # If only one or zero points, use arbitrary high values
+             bug_threshold = 3000
+             anomaly_threshold = 2800
+    else:
+        top_cases = receipts_sorted[:top_5_percent_index]
+        bug_threshold = top_cases.max()
+        anomaly_threshold = np.quantile(top_cases, 0.9)
+
+    # Ensure thresholds are not equal and have a reasonable gap
+    if anomaly_threshold >= bug_threshold:
+        anomaly_threshold = bug_threshold * 0.9 
+
+    # --- Rate Optimization ---
+    bugs = receipts > bug_threshold
+    anomalies = (receipts > anomaly_threshold) & (receipts <= bug_threshold)
+
+    best_bug_rate = 0.005 # Default bug rate
+    if bugs.any():
+         # For bugs, we assume a near-zero rate is best
+        pass # Keep the default rate
+
+    best_anomaly_rate = 0.45 # Default anomaly rate
+    if anomalies.any():
+        # Every candidate rate is scored in one (rates, cases) array
+        rates = np.arange(30, 76, 2) / 100
+        predicted = predict(rule, miles[anomalies], receipts[anomalies], anomaly_rate=rates[:, None])
+        maes = np.abs(predicted - expected[anomalies]).mean(axis=1)
+        best_anomaly_rate = float(rates[maes.argmin()])
+
+    return day, {
+        'bug_threshold': bug_threshold,
+        'bug_rate': best_bug_rate,
+        'anomaly_threshold': anomaly_threshold,
+        'anomaly_rate': best_anomaly_rate,
+    }
 
 
 def run_solver():
@@ -57,20 +59,7 @@ def run_solver():
     Finds the optimal 'outlier_receipt_rate' for each day by focusing only 
     on the high-error outlier cases for that specific day.
     """
-    with open('public_cases.json', 'r') as f:
-        data = json.load(f)
-
-    df_full = pd.json_normalize(data)
-    df_full.rename(columns={
-        'input.trip_duration_days': 'trip_duration_days',
-        'input.miles_traveled': 'miles_traveled',
-        'input.total_receipts_amount': 'total_receipts_amount'
-    }, inplace=True)
-    
-    for col in ['trip_duration_days', 'miles_traveled', 'total_receipts_amount', 'expected_output']:
-        df_full[col] = pd.to_numeric(df_full[col], errors='coerce')
-
-    df_full.dropna(inplace=True)
+    df_full = pd.DataFrame(load_cases(), columns=CASE_COLUMNS)
 
     # These are the original rules, we will use them as a base
     current_rules = {
@@ -84,65 +73,17 @@ def run_solver():
     }
 
     final_params = {}
-    
-    for day in range(1, 8):
-        df_day = df_full[df_full['trip_duration_days'] == day].copy()
-        if df_day.empty:
-            continue
-            
+
+    by_day = day_arrays(df_full)
+    results = map_days(optimize_day, [(day, *by_day[day], current_rules[day]) for day in range(1, 8) if day in by_day])
+
+    for day, params in results:
         print(f"\n--- Optimizing for Day {day} ---")
+        print(f"  Calculated Bug Threshold: ${params['bug_threshold']:.2f}")
+        print(f"  Calculated Anomaly Threshold: ${params['anomaly_threshold']:.2f}")
 
-        # --- Data-Driven Threshold Detection ---
-        df_day_sorted = df_day.sort_values('total_receipts_amount', ascending=False)
-        top_5_percent_index = int(len(df_day_sorted) * 0.05)
-        
-        if top_5_percent_index < 2: # Ensure we have enough data points
-             if len(df_day_sorted) > 1:
-                 bug_threshold = df_day_sorted.iloc[0]['total_receipts_amount']
-                 anomaly_threshold = df_day_sorted.iloc[1]['total_receipts_amount']
-             else: # If only one or zero points, use arbitrary high values
-                 bug_threshold = 3000
-                 anomaly_threshold = 2800
-        else:
-            top_cases = df_day_sorted.head(top_5_percent_index)
-            bug_threshold = top_cases['total_receipts_amount'].max()
-            anomaly_threshold = top_cases['total_receipts_amount'].quantile(0.9)
-
-        # Ensure thresholds are not equal and have a reasonable gap
-        if anomaly_threshold >= bug_threshold:
-            anomaly_threshold = bug_threshold * 0.9 
-
-        print(f"  Calculated Bug Threshold: ${bug_threshold:.2f}")
-        print(f"  Calculated Anomaly Threshold: ${anomaly_threshold:.2f}")
-
-        # --- Rate Optimization ---
-        df_bugs = df_day[df_day['total_receipts_amount'] > bug_threshold]
-        df_anomalies = df_day[(df_day['total_receipts_amount'] > anomaly_threshold) & (df_day['total_receipts_amount'] <= bug_threshold)]
-
-        best_bug_rate = 0.005 # Default bug rate
-        if not df_bugs.empty:
-             # For bugs, we assume a near-zero rate is best
-            pass # Keep the default rate
-
-        best_anomaly_rate = 0.45 # Default anomaly rate
-        if not df_anomalies.empty:
-            best_mae = float('inf')
-            for rate in [x/100 for x in range(30, 76, 2)]:
-                params = {day: {'anomaly_rate': rate}}
-                calc = ReimbursementCalculator(rules=current_rules, params=params)
-                predicted = df_anomalies.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                mae = mean_absolute_error(df_anomalies['expected_output'], predicted)
-                if mae < best_mae:
-                    best_mae = mae
-                    best_anomaly_rate = rate
-
-        final_params[day] = {
-            'bug_threshold': bug_threshold,
-            'bug_rate': best_bug_rate,
-            'anomaly_threshold': anomaly_threshold,
-            'anomaly_rate': best_anomaly_rate,
-        }
-        print(f"  Optimized Rates: Anomaly={best_anomaly_rate}, Bug={best_bug_rate}")
+        final_params[day] = params
+        print(f"  Optimized Rates: Anomaly={params['anomaly_rate']}, Bug={params['bug_rate']}")
 
 
     print("\n\n--- Final Optimized Parameters ---")
@@ -2,9 +2,9 @@ import json
 import pandas as pd
 import numpy as np
 import itertools
-from sklearn.metrics import mean_absolute_error
 from joblib import Parallel, delayed
 import joblib
+from data_io import mean_abs_error
 
 # Re-using the class structure from solution.py for consistency
 class ReimbursementCalculator:
@@ -106,7 +106,7 @@ def run_solver():
                 params = {day: {'outlier_threshold': outlier_threshold, 'outlier_rate': rate, 'outlier_penalty': penalty}}
                 calc = ReimbursementCalculator(rules=current_rules, params=params)
                 predicted = df_outliers.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                mae = mean_absolute_error(df_outliers['expected_output'], predicted)
+                mae = mean_abs_error(df_outliers['expected_output'], predicted)
 
                 if mae < best_day_mae:
                     best_day_mae = mae
@@ -2,9 +2,9 @@ import json
 import pandas as pd
 import numpy as np
 import itertools
-from sklearn.metrics import mean_absolute_error
 from joblib import Parallel, delayed
 import joblib
+from data_io import mean_abs_error
 
 # Re-using the class structure from solution.py for consistency
 class ReimbursementCalculator:
@@ -109,7 +109,7 @@ def run_solver():
                     params = {day: {'outlier_threshold': threshold, 'outlier_rate': rate, 'outlier_penalty': penalty}}
                     calc = ReimbursementCalculator(rules=current_rules, params=params)
                     predicted = df_outliers.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-                    mae = mean_absolute_error(df_outliers['expected_output'], predicted)
+                    mae = mean_abs_error(df_outliers['expected_output'], predicted)
 
                     if mae < best_mae_for_threshold:
                         best_mae_for_threshold = mae
@@ -120,7 +120,7 @@ def run_solver():
             params = {day: {'outlier_threshold': threshold, 'outlier_rate': best_rate_for_threshold, 'outlier_penalty': best_penalty_for_threshold}}
             calc = ReimbursementCalculator(rules=current_rules, params=params)
             predicted = df_day.apply(lambda r: calc.calculate(r.trip_duration_days, r.miles_traveled, r.total_receipts_amount), axis=1)
-            total_mae = mean_absolute_error(df_day['expected_output'], predicted)
+            total_mae = mean_abs_error(df_day['expected_output'], predicted)
 
             if total_mae < best_day_mae:
                 best_day_mae = total_mae